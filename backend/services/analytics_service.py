@@ -44,13 +44,17 @@ class AnalyticsService:
     async def _calculate_operational_metrics(self, warehouse_grid, current_orders, robots) -> Dict[str, Any]:
         """Calculate key operational metrics"""
         try:
+            # One pass per collection for every status count
+            order_statuses = Counter(o.status for o in current_orders)
+            robot_statuses = Counter(r.status for r in robots)
+            
             total_orders = len(current_orders)
-            completed_orders = len([o for o in current_orders if o.status == "completed"])
-            pending_orders = len([o for o in current_orders if o.status == "pending"])
-            processing_orders = len([o for o in current_orders if o.status == "processing"])
+            completed_orders = order_statuses["completed"]
+            pending_orders = order_statuses["pending"]
+            processing_orders = order_statuses["processing"]
             
-            active_robots = len([r for r in robots if r.status == "busy"])
-            idle_robots = len([r for r in robots if r.status == "idle"])
+            active_robots = robot_statuses["busy"]
+            idle_robots = robot_statuses["idle"]
             total_robots = len(robots)
             
             # Calculate completion rate
@@ -266,25 +270,26 @@ class AnalyticsService:
             # Performance metrics
             total_distance = sum(r.total_distance_traveled for r in robots)
             total_orders = sum(r.orders_completed for r in robots)
-            average_battery = np.mean([r.battery for r in robots])
+            battery_levels = [r.battery for r in robots]
+            average_battery = np.mean(battery_levels)
+            robot_statuses = Counter(r.status for r in robots)
             
             robot_analytics["performance_metrics"] = {
                 "total_distance_traveled": total_distance,
                 "total_orders_completed": total_orders,
                 "average_battery": round(average_battery, 2),
                 "average_efficiency": total_orders / max(total_distance, 1),
-                "active_robots": len([r for r in robots if r.status == "busy"]),
-                "idle_robots": len([r for r in robots if r.status == "idle"])
+                "active_robots": robot_statuses["busy"],
+                "idle_robots": robot_statuses["idle"]
             }
             
             # Battery analysis
-            battery_levels = [r.battery for r in robots]
             robot_analytics["battery_analysis"] = {
-                "average_battery": round(np.mean(battery_levels), 2),
+                "average_battery": round(average_battery, 2),
                 "min_battery": round(min(battery_levels), 2),
                 "max_battery": round(max(battery_levels), 2),
-                "low_battery_robots": len([r for r in robots if r.battery < 30]),
-                "critical_battery_robots": len([r for r in robots if r.battery < 10])
+                "low_battery_robots": sum(1 for b in battery_levels if b < 30),
+                "critical_battery_robots": sum(1 for b in battery_levels if b < 10)
             }
             
             # Efficiency ranking
@@ -339,12 +344,13 @@ class AnalyticsService:
             }
             
             # Warehouse efficiency (overall)
+            order_statuses = Counter(o.status for o in current_orders)
             total_orders = len(current_orders)
-            completed_orders = len([o for o in current_orders if o.status == "completed"])
+            completed_orders = order_statuses["completed"]
             efficiency_metrics["warehouse_efficiency"] = (completed_orders / total_orders * 100) if total_orders > 0 else 0
             
             # Robot efficiency
-            active_robots = len([r for r in robots if r.status == "busy"])
+            active_robots = sum(1 for r in robots if r.status == "busy")
             total_robots = len(robots)
             efficiency_metrics["robot_efficiency"] = (active_robots / total_robots * 100) if total_robots > 0 else 0
             
@@ -355,8 +361,8 @@ class AnalyticsService:
                 efficiency_metrics["inventory_efficiency"] = ((total_items - low_stock_items) / total_items * 100) if total_items > 0 else 0
             
             # Order fulfillment efficiency
-            processing_orders = len([o for o in current_orders if o.status == "processing"])
-            pending_orders = len([o for o in current_orders if o.status == "pending"])
+            processing_orders = order_statuses["processing"]
+            pending_orders = order_statuses["pending"]
             total_active_orders = processing_orders + pending_orders
             efficiency_metrics["order_fulfillment_efficiency"] = (processing_orders / total_active_orders * 100) if total_active_orders > 0 else 0
             
@@ -413,10 +419,11 @@ class AnalyticsService:
             }
             
             # Capacity planning
+            idle_robots = sum(1 for r in robots if r.status == "idle")
             predictions["capacity_planning"] = {
-                "current_capacity": len([r for r in robots if r.status == "idle"]),
+                "current_capacity": idle_robots,
                 "required_capacity": max(2, int(current_demand / 5)),
-                "capacity_gap": max(0, int(current_demand / 5) - len([r for r in robots if r.status == "idle"])),
+                "capacity_gap": max(0, int(current_demand / 5) - idle_robots),
                 "recommendation": "add_robots" if current_demand > 20 else "maintain"
             }
             
@@ -1,221 +1,794 @@
 import numpy as np
 from typing import List, Dict, Any, Optional, Tuple
-import random
 import logging
 from datetime import datetime, timedelta
 import heapq
+import asyncio
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+import threading
+from collections import OrderedDict, deque
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:  # numba is optional; kernels then run as plain Python
+    NUMBA_AVAILABLE = False
+    
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
 
 logger = logging.getLogger(__name__)
 
+# Kernels are declared with explicit signatures so numba compiles them (or loads them from its
+# on-disk cache) at import time instead of on the first request; the blocked mask is read-only
+BLOCKED_MASK_T = "Array(uint8, 2, 'C', readonly=True)"
+
+# Oldest layout optimization results are dropped beyond this many entries
+MAX_OPTIMIZATION_HISTORY = 1000
+
+# Memoized A* paths and single-source distance fields, keyed by layout version
+MAX_PATH_CACHE_SIZE = 4096
+MAX_FIELD_CACHE_SIZE = 64
+MAX_LAYOUT_CACHE_SIZE = 8
+
+# Each cached field holds two full-grid arrays, so larger grids recompute their fields per leg
+MAX_CACHED_FIELD_CELLS = 1 << 16
+
+# BFS distance of cells no source reaches; fields store int32 distances to halve their footprint
+UNREACHED = np.iinfo(np.int32).max
+
+# 4-connected grid moves
+NEIGHBORS = ((0, 1), (1, 0), (0, -1), (-1, 0))
+
+# A* open-set keys pack (f << 40) | (h << 20) | (x * rows + y) into one int, so equal-f
+# entries pop nearest-goal first; only grids under 2**20 cells fit, larger ones are routed by BFS
+HEAP_F_SHIFT = 40
+HEAP_H_SHIFT = 20
+HEAP_CELL_MASK = (1 << HEAP_H_SHIFT) - 1
+
+# Route searches from every service instance share one pool; its threads start on first use
+_ROUTE_EXECUTOR = ThreadPoolExecutor(max_workers=os.cpu_count(), thread_name_prefix="route")
+
+
+def _int8_grid(warehouse_grid) -> np.ndarray:
+    """Return the warehouse grid as a contiguous int8 array (0 aisle, 1 shelf, 2 entrance, 3 exit)"""
+    return np.ascontiguousarray(warehouse_grid.grid, dtype=np.int8)
+
+
+def _rc_array(points) -> np.ndarray:
+    """(N, 2) int32 array of the row/col of each layout point"""
+    return np.array([(p['row'], p['col']) for p in points], dtype=np.int32).reshape(-1, 2)
+
+
+def _min_manhattan(points: np.ndarray, targets: np.ndarray) -> np.ndarray:
+    """Manhattan distance from each (N, 2) point to its nearest (M, 2) target, via an (N, M) broadcast"""
+    distances = np.abs(points[:, None, 0] - targets[None, :, 0]) + np.abs(points[:, None, 1] - targets[None, :, 1])
+    return distances.min(axis=1)
+
+
+# Route action codes, indexing ROUTE_ACTIONS
+ACTION_MOVE, ACTION_START, ACTION_PICKUP, ACTION_DELIVER = 0, 1, 2, 3
+ROUTE_ACTIONS = ("move", "start", "pickup", "deliver")
+
+
+@dataclass
+class Route:
+    """Robot route as parallel arrays; converted to the list-of-dict API format only by to_dicts()"""
+    xs: np.ndarray
+    ys: np.ndarray
+    action_codes: np.ndarray
+    items: List[Optional[str]]
+    quantities: List[Optional[int]]
+    
+    @classmethod
+    def from_legs(cls, legs) -> "Route":
+        """Concatenate (coords, action_code, item, quantity) legs, where coords is an (N, 2) x/y array"""
+        if not legs:
+            empty = np.empty(0, dtype=np.int32)
+            return cls(empty, empty, np.empty(0, dtype=np.int8), [], [])
+        
+        coords = np.concatenate([leg[0] for leg in legs]).astype(np.int32, copy=False)
+        action_codes = np.concatenate([np.full(len(leg[0]), leg[1], dtype=np.int8) for leg in legs])
+        items, quantities = [], []
+        for leg_coords, _, item, quantity in legs:
+            items.extend([item] * len(leg_coords))
+            quantities.extend([quantity] * len(leg_coords))
+        return cls(coords[:, 0], coords[:, 1], action_codes, items, quantities)
+    
+    def __len__(self) -> int:
+        return len(self.xs)
+    
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        """Serialize to the route format returned by the API"""
+        route = []
+        for x, y, code, item, quantity in zip(self.xs.tolist(), self.ys.tolist(),
+                                              self.action_codes.tolist(), self.items, self.quantities):
+            step = {"x": x, "y": y, "action": ROUTE_ACTIONS[code]}
+            if code != ACTION_MOVE:
+                step["item"] = item
+            if code == ACTION_PICKUP:
+                step["quantity"] = quantity
+            route.append(step)
+        return route
+
+
+@dataclass(frozen=True)
+class _Layout:
+    """Snapshot of what route search reads from a warehouse grid, taken on the event loop"""
+    version: Any
+    blocked: np.ndarray
+    exits: Tuple[Tuple[int, int], ...]
+
+
+@njit("Tuple((int64, int64, float64, int64))(int32[:], int32[:])", cache=True)
+def _route_metrics_nb(xs, ys):
+    """Fused route metrics over the route's cell coordinates: (distance, time, energy, score)"""
+    total_distance = 0
+    for i in range(1, xs.shape[0]):
+        total_distance += abs(xs[i] - xs[i - 1]) + abs(ys[i] - ys[i - 1])
+    estimated_time = total_distance * 2  # 2 seconds per cell
+    energy_consumption = total_distance * 0.5  # 0.5% battery per cell
+    optimization_score = max(0, 100 - total_distance * 2)  # Higher score for shorter routes
+    return total_distance, estimated_time, energy_consumption, optimization_score
+
+
+def _layout_version(warehouse_grid) -> Any:
+    """Cache token for the current layout: the grid's version counter if it keeps one, else a hash of its cells"""
+    version = getattr(warehouse_grid, "version", None)
+    if version is not None:
+        return (id(warehouse_grid), version)
+    grid = _int8_grid(warehouse_grid)
+    return hash((grid.shape, grid.tobytes()))
+
+
+_MISSING = object()
+
+
+class _LRUCache:
+    """Thread-safe bounded mapping that evicts the least recently used entry"""
+    
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+    
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+@njit(f"int32[:, ::1]({BLOCKED_MASK_T}, int64, int64, int64, int64)", cache=True, nogil=True)
+def _astar_nb(blocked, sx, sy, ex, ey):
+    """A* over a uint8 blocked mask; returns the (N, 2) x/y path excluding the start, empty if unreachable"""
+    rows, cols = blocked.shape
+    n = rows * cols
+    empty = np.empty((0, 2), dtype=np.int32)
+    if not (0 <= sx < cols and 0 <= sy < rows):
+        return empty
+    
+    g_score = np.full(n, np.inf, dtype=np.float32)
+    came_from = np.full(n, -1, dtype=np.int32)
+    
+    # Heuristic to (ex, ey), filled in the first time each cell is reached
+    h_cache = np.full(n, -1, dtype=np.int32)
+    
+    # Binary min-heap of packed int64 keys: pops by f, then h, then x, then y
+    heap = np.empty(4 * n + 1, dtype=np.int64)
+    
+    start = sy * cols + sx
+    g_score[start] = 0.0
+    h_start = abs(sx - ex) + abs(sy - ey)
+    heap[0] = (h_start << HEAP_F_SHIFT) | (h_start << HEAP_H_SHIFT) | (sx * rows + sy)
+    size = 1
+    
+    while size > 0:
+        key = heap[0]
+        size -= 1
+        last = heap[size]
+        i = 0
+        while True:
+            child = 2 * i + 1
+            if child >= size:
+                break
+            if child + 1 < size and heap[child + 1] < heap[child]:
+                child += 1
+            if heap[child] >= last:
+                break
+            heap[i] = heap[child]
+            i = child
+        if size > 0:
+            heap[i] = last
+        
+        packed = key & HEAP_CELL_MASK
+        x = packed // rows
+        y = packed % rows
+        current = y * cols + x
+        
+        if x == ex and y == ey:
+            length = 0
+            node = current
+            while came_from[node] != -1:
+                length += 1
+                node = came_from[node]
+            path = np.empty((length, 2), dtype=np.int32)
+            node = current
+            for k in range(length - 1, -1, -1):
+                path[k, 0] = node % cols
+                path[k, 1] = node // cols
+                node = came_from[node]
+            return path
+        
+        tentative_g = g_score[current] + 1.0
+        for k in range(4):
+            if k == 0:
+                nx, ny = x, y + 1
+            elif k == 1:
+                nx, ny = x + 1, y
+            elif k == 2:
+                nx, ny = x, y - 1
+            else:
+                nx, ny = x - 1, y
+            if not (0 <= nx < cols and 0 <= ny < rows) or blocked[ny, nx]:
+                continue
+            
+            neighbor = ny * cols + nx
+            if tentative_g < g_score[neighbor]:
+                came_from[neighbor] = current
+                g_score[neighbor] = tentative_g
+                if h_cache[neighbor] < 0:
+                    h_cache[neighbor] = abs(nx - ex) + abs(ny - ey)
+                h = np.int64(h_cache[neighbor])
+                f = np.int64(tentative_g) + h
+                
+                # Sift the new entry up
+                item = (f << HEAP_F_SHIFT) | (h << HEAP_H_SHIFT) | (nx * rows + ny)
+                i = size
+                size += 1
+                while i > 0:
+                    parent = (i - 1) // 2
+                    if heap[parent] <= item:
+                        break
+                    heap[i] = heap[parent]
+                    i = parent
+                heap[i] = item
+    
+    return empty
+
+
+def _bfs_field_py(blocked, sources) -> Tuple[np.ndarray, np.ndarray]:
+    """Multi-source BFS over a blocked mask: flat distance (UNREACHED if unreached) and parent (-1 at sources)"""
+    rows, cols = blocked.shape
+    cells = blocked.tobytes()
+    dist = [UNREACHED] * (rows * cols)
+    parent = [-1] * (rows * cols)
+    
+    queue = deque()
+    for source in sources:
+        source_y, source_x = divmod(source, cols)
+        if 0 <= source_y < rows and dist[source] != 0:
+            dist[source] = 0
+            queue.append(source)
+    
+    while queue:
+        current = queue.popleft()
+        current_y, current_x = divmod(current, cols)
+        next_d = dist[current] + 1
+        for dx, dy in NEIGHBORS:
+            neighbor_x, neighbor_y = current_x + dx, current_y + dy
+            if not (0 <= neighbor_x < cols and 0 <= neighbor_y < rows):
+                continue
+            
+            neighbor = neighbor_y * cols + neighbor_x
+            if not cells[neighbor] and next_d < dist[neighbor]:
+                dist[neighbor] = next_d
+                parent[neighbor] = current
+                queue.append(neighbor)
+    
+    return np.array(dist, dtype=np.int32), np.array(parent, dtype=np.int32)
+
+
+@njit(f"Tuple((int32[::1], int32[::1]))({BLOCKED_MASK_T}, int64[::1])", cache=True, nogil=True)
+def _bfs_field_nb(blocked, sources):
+    """numba twin of _bfs_field_py, with a flat ring-buffer queue; visits cells in the same order"""
+    rows, cols = blocked.shape
+    n = rows * cols
+    dist = np.full(n, UNREACHED, dtype=np.int32)
+    parent = np.full(n, -1, dtype=np.int32)
+    queue = np.empty(n, dtype=np.int32)
+    head = 0
+    tail = 0
+    
+    for i in range(sources.shape[0]):
+        source = sources[i]
+        if 0 <= source < n and dist[source] != 0:
+            dist[source] = 0
+            queue[tail] = source
+            tail += 1
+    
+    while head < tail:
+        current = queue[head]
+        head += 1
+        x = current % cols
+        y = current // cols
+        next_d = dist[current] + 1
+        for k in range(4):
+            if k == 0:
+                nx, ny = x, y + 1
+            elif k == 1:
+                nx, ny = x + 1, y
+            elif k == 2:
+                nx, ny = x, y - 1
+            else:
+                nx, ny = x - 1, y
+            if not (0 <= nx < cols and 0 <= ny < rows) or blocked[ny, nx]:
+                continue
+            
+            neighbor = ny * cols + nx
+            if next_d < dist[neighbor]:
+                dist[neighbor] = next_d
+                parent[neighbor] = current
+                queue[tail] = neighbor
+                tail += 1
+    
+    return dist, parent
+
+
+def _bfs_field(blocked, sources) -> Tuple[np.ndarray, np.ndarray]:
+    """BFS distance/parent field from flat source cells, on the numba kernel when available"""
+    if NUMBA_AVAILABLE:
+        return _bfs_field_nb(blocked, np.asarray(sources, dtype=np.int64))
+    return _bfs_field_py(blocked, sources)
+
+
 class OptimizationService:
     def __init__(self):
-        self.optimization_history = []
+        self.optimization_history = deque(maxlen=MAX_OPTIMIZATION_HISTORY)
         self.performance_metrics = {}
+        self._path_cache = _LRUCache(MAX_PATH_CACHE_SIZE)
+        self._field_cache = _LRUCache(MAX_FIELD_CACHE_SIZE)
+        self._blocked_cache = _LRUCache(MAX_LAYOUT_CACHE_SIZE)
     
     async def optimize_order_fulfillment(self, order, warehouse_grid, robots) -> Dict[str, Any]:
         """Optimize route for order fulfillment"""
+        results = await self.optimize_orders_fulfillment([order], warehouse_grid, robots)
+        return results[0]
+    
+    async def optimize_orders_fulfillment(self, orders, warehouse_grid, robots) -> List[Dict[str, Any]]:
+        """Optimize routes for a batch of orders, each reserving its robot before the next is assigned"""
+        # Robot assignment and the grid snapshot happen here on the event loop, so the whole batch
+        # sees one consistent fleet and layout; only the route searches go to the worker pool
+        loop = asyncio.get_running_loop()
+        available = list(robots)
+        searches = []
         try:
-            # Find items in the order
-            item_locations = []
-            for item_data in order.items:
-                item_name = item_data.get("product")
-                # Find item in inventory
-                for inventory_item in warehouse_grid.inventory:
-                    if inventory_item.name == item_name:
-                        item_locations.append({
-                            "x": inventory_item.location_x,
-                            "y": inventory_item.location_y,
-                            "item": inventory_item,
-                            "quantity": item_data.get("quantity", 1)
-                        })
-                        break
-            
-            if not item_locations:
-                return {}
-            
-            # Find best robot for this order
-            best_robot = self._find_best_robot(robots, item_locations[0])
-            if not best_robot:
-                return {}
-            
-            # Generate optimized route
-            route = self._generate_optimized_route(
-                best_robot, item_locations, warehouse_grid
-            )
-            
-            # Calculate route metrics
-            route_metrics = self._calculate_route_metrics(route, best_robot)
-            
-            return {
-                "route": route,
-                "robot_id": best_robot.id,
-                "estimated_time": route_metrics["estimated_time"],
-                "total_distance": route_metrics["total_distance"],
-                "energy_consumption": route_metrics["energy_consumption"],
-                "optimization_score": route_metrics["optimization_score"]
-            }
-            
+            layout = self._layout_state(warehouse_grid)
+            inventory_by_name = self._inventory_index(warehouse_grid)
+        except Exception as e:
+            logger.error(f"Error optimizing order fulfillment: {e}")
+            return [{} for _ in orders]
+        
+        for order in orders:
+            try:
+                assignment = self._assign_order(order, inventory_by_name, available)
+            except Exception as e:
+                logger.error(f"Error optimizing order fulfillment: {e}")
+                assignment = None
+            
+            if assignment is None:
+                searches.append(None)
+                continue
+            
+            robot, item_locations = assignment
+            available = [r for r in available if r is not robot]
+            searches.append(loop.run_in_executor(
+                _ROUTE_EXECUTOR, self._optimize_order_sync,
+                robot.id, {"x": robot.x, "y": robot.y}, item_locations, layout
+            ))
+        
+        return await asyncio.gather(*[self._route_result(search) for search in searches])
+    
+    async def _route_result(self, search) -> Dict[str, Any]:
+        """Await one pooled route search, mapping a missing assignment or a failure to {}"""
+        if search is None:
+            return {}
+        try:
+            return await search
         except Exception as e:
             logger.error(f"Error optimizing order fulfillment: {e}")
             return {}
     
+    def _assign_order(self, order, inventory_by_name, robots) -> Optional[Tuple[Any, List[Dict[str, Any]]]]:
+        """Pick the robot and item locations for an order, or None if it cannot be fulfilled"""
+        # Find items in the order
+        item_locations = []
+        for item_data in order.items:
+            inventory_item = inventory_by_name.get(item_data.get("product"))
+            if inventory_item is not None:
+                item_locations.append({
+                    "x": inventory_item.location_x,
+                    "y": inventory_item.location_y,
+                    "name": inventory_item.name,
+                    "quantity": item_data.get("quantity", 1)
+                })
+        
+        if not item_locations:
+            return None
+        
+        # Find best robot for this order
+        best_robot = self._find_best_robot(robots, item_locations[0])
+        if not best_robot:
+            return None
+        
+        return best_robot, item_locations
+    
+    def _optimize_order_sync(self, robot_id, start, item_locations, layout) -> Dict[str, Any]:
+        """Route an assigned order; reads only its snapshot arguments, so it is safe on the worker pool"""
+        # Generate optimized route
+        route = self._generate_optimized_route(start, item_locations, layout)
+        
+        # Calculate route metrics
+        route_metrics = self._calculate_route_metrics(route)
+        
+        return {
+            "route": route.to_dicts(),
+            "robot_id": robot_id,
+            "estimated_time": route_metrics["estimated_time"],
+            "total_distance": route_metrics["total_distance"],
+            "energy_consumption": route_metrics["energy_consumption"],
+            "optimization_score": route_metrics["optimization_score"]
+        }
+    
+    def _inventory_index(self, warehouse_grid) -> Dict[str, Any]:
+        """Name -> inventory item, keeping the first item listed under each name"""
+        return {item.name: item for item in reversed(warehouse_grid.inventory)}
+    
     def _find_best_robot(self, robots, first_item_location) -> Optional[Any]:
         """Find the best available robot for the order"""
-        available_robots = [r for r in robots if r.status == "idle" and r.battery > 20]
+        if not robots:
+            return None
         
-        if not available_robots:
+        fleet = self._robot_arrays(robots)
+        available = fleet["idle"] & (fleet["battery"] > 20)
+        if not available.any():
             return None
         
         # Score robots based on distance, battery, and efficiency
-        robot_scores = []
-        for robot in available_robots:
-            distance = abs(robot.x - first_item_location["x"]) + abs(robot.y - first_item_location["y"])
-            battery_score = robot.battery / 100
-            efficiency_score = robot.orders_completed / max(robot.total_distance_traveled, 1)
-            
-            # Combined score (lower distance, higher battery, higher efficiency = better)
-            score = (1 / (distance + 1)) * 0.4 + battery_score * 0.4 + efficiency_score * 0.2
-            robot_scores.append((score, robot))
+        distance = np.abs(fleet["x"] - first_item_location["x"]) + np.abs(fleet["y"] - first_item_location["y"])
+        efficiency_score = fleet["orders_completed"] / np.maximum(fleet["distance_traveled"], 1)
+        
+        # Combined score (lower distance, higher battery, higher efficiency = better)
+        score = (1 / (distance + 1)) * 0.4 + (fleet["battery"] / 100) * 0.4 + efficiency_score * 0.2
         
         # Return robot with highest score
-        robot_scores.sort(key=lambda x: x[0], reverse=True)
-        return robot_scores[0][1] if robot_scores else None
+        return robots[int(np.argmax(np.where(available, score, -np.inf)))]
     
-    def _generate_optimized_route(self, robot, item_locations, warehouse_grid) -> List[Dict[str, Any]]:
-        """Generate optimized route using nearest neighbor algorithm"""
-        try:
-            route = []
-            current_pos = {"x": robot.x, "y": robot.y}
-            unvisited = item_locations.copy()
-            
-            # Add starting position
-            route.append({
-                "x": current_pos["x"],
-                "y": current_pos["y"],
-                "action": "start",
-                "item": None
-            })
+    def _robot_arrays(self, robots) -> Dict[str, np.ndarray]:
+        """Structure-of-arrays view of the fleet, one entry per robot in input order"""
+        count = len(robots)
+        return {
+            "x": np.fromiter((r.x for r in robots), dtype=np.float64, count=count),
+            "y": np.fromiter((r.y for r in robots), dtype=np.float64, count=count),
+            "battery": np.fromiter((r.battery for r in robots), dtype=np.float64, count=count),
+            "orders_completed": np.fromiter((r.orders_completed for r in robots), dtype=np.float64, count=count),
+            "distance_traveled": np.fromiter((r.total_distance_traveled for r in robots), dtype=np.float64, count=count),
+            "idle": np.fromiter((r.status == "idle" for r in robots), dtype=bool, count=count)
+        }
+    
+    def _generate_optimized_route(self, start, item_locations, layout) -> "Route":
+        """Generate optimized route using nearest neighbor over true shortest-path distances"""
+        if not item_locations or not layout.exits:
+            return Route.from_legs([])
+        
+        current_pos = {"x": start["x"], "y": start["y"]}
+        
+        # Add starting position
+        legs = [(np.array([[start["x"], start["y"]]], dtype=np.int32), ACTION_START, None, None)]
+        
+        rows, cols = layout.blocked.shape
+        
+        # Item coordinates and flat cell indices, built once per route
+        item_xy = np.array([(loc["x"], loc["y"]) for loc in item_locations], dtype=np.int64).reshape(-1, 2)
+        in_bounds = (item_xy[:, 0] >= 0) & (item_xy[:, 0] < cols) & (item_xy[:, 1] >= 0) & (item_xy[:, 1] < rows)
+        item_cells = np.where(in_bounds, item_xy[:, 1] * cols + item_xy[:, 0], 0)
+        visited = np.zeros(len(item_locations), dtype=bool)
+        
+        # Visit each item location
+        for _ in range(len(item_locations)):
+            # One BFS from the current position gives the distance to every item;
+            # rank by path length (unreachable after everything), then Manhattan distance
+            dist, parent = self._shortest_paths_from(current_pos, layout)
+            path_len = np.where(in_bounds, np.minimum(dist[item_cells].astype(np.int64), rows * cols), rows * cols)
+            manhattan = np.abs(item_xy[:, 0] - current_pos["x"]) + np.abs(item_xy[:, 1] - current_pos["y"])
+            rank = (path_len * (rows + cols) + manhattan).astype(np.float64)
+            rank[visited] = np.inf
+            nearest_idx = int(np.argmin(rank))
+            nearest = item_locations[nearest_idx]
+            
+            # Add path to nearest location
+            target = {"x": nearest["x"], "y": nearest["y"]}
+            if path_len[nearest_idx] < rows * cols:
+                path = self._path_from_parents(parent, target, cols)
+            else:
+                path = self._path_coords(current_pos, target, layout)
+            legs.append((path, ACTION_MOVE, None, None))
             
-            # Visit each item location
-            while unvisited:
-                # Find nearest unvisited location
-                nearest = min(unvisited, key=lambda loc: 
-                    abs(loc["x"] - current_pos["x"]) + abs(loc["y"] - current_pos["y"])
-                )
-                
-                # Add path to nearest location
-                path = self._find_path(current_pos, {"x": nearest["x"], "y": nearest["y"]}, warehouse_grid)
-                route.extend(path)
-                
-                # Add pickup action
-                route.append({
-                    "x": nearest["x"],
-                    "y": nearest["y"],
-                    "action": "pickup",
-                    "item": nearest["item"].name,
-                    "quantity": nearest["quantity"]
-                })
-                
-                current_pos = {"x": nearest["x"], "y": nearest["y"]}
-                unvisited.remove(nearest)
+            # Add pickup action
+            legs.append((item_xy[nearest_idx:nearest_idx + 1], ACTION_PICKUP,
+                         nearest["name"], nearest["quantity"]))
             
-            # Return to nearest exit
-            nearest_exit = min(warehouse_grid.exits, key=lambda exit_pos:
-                abs(exit_pos["x"] - current_pos["x"]) + abs(exit_pos["y"] - current_pos["y"])
+            current_pos = target
+            visited[nearest_idx] = True
+        
+        # Return to nearest exit, read off the layout's exit distance field
+        path_to_exit = self._path_to_nearest_exit(current_pos, layout)
+        if path_to_exit is not None:
+            nearest_exit = {"x": int(path_to_exit[-1, 0]), "y": int(path_to_exit[-1, 1])} if len(path_to_exit) else current_pos
+        else:
+            exit_x, exit_y = min(layout.exits, key=lambda exit_pos:
+                abs(exit_pos[0] - current_pos["x"]) + abs(exit_pos[1] - current_pos["y"])
             )
-            
-            path_to_exit = self._find_path(current_pos, nearest_exit, warehouse_grid)
-            route.extend(path_to_exit)
-            
-            # Add delivery action
-            route.append({
-                "x": nearest_exit["x"],
-                "y": nearest_exit["y"],
-                "action": "deliver",
-                "item": None
-            })
-            
-            return route
-            
-        except Exception as e:
-            logger.error(f"Error generating optimized route: {e}")
-            return []
+            nearest_exit = {"x": exit_x, "y": exit_y}
+            path_to_exit = self._path_coords(current_pos, nearest_exit, layout)
+        legs.append((path_to_exit, ACTION_MOVE, None, None))
+        
+        # Add delivery action
+        legs.append((np.array([[nearest_exit["x"], nearest_exit["y"]]], dtype=np.int32), ACTION_DELIVER, None, None))
+        
+        return Route.from_legs(legs)
+    
+    def _shortest_paths_from(self, start, layout) -> Tuple[np.ndarray, np.ndarray]:
+        """Single-source BFS over the grid, returning flat distance and parent arrays"""
+        blocked = layout.blocked
+        key = (start["x"], start["y"], layout.version)
+        cached = self._field_cache.get(key)
+        if cached is not None:
+            return cached
+        
+        rows, cols = blocked.shape
+        sources = [start["y"] * cols + start["x"]] if 0 <= start["x"] < cols else []
+        field = _bfs_field(blocked, sources)
+        if rows * cols <= MAX_CACHED_FIELD_CELLS:
+            self._field_cache.put(key, field)
+        return field
+    
+    def _layout_state(self, warehouse_grid) -> _Layout:
+        """Layout snapshot with its cache token and read-only uint8 blocked mask (1 = shelf), built once per layout version"""
+        version = _layout_version(warehouse_grid)
+        blocked = self._blocked_cache.get(version)
+        if blocked is None:
+            blocked = (_int8_grid(warehouse_grid) == 1).astype(np.uint8)
+            blocked.flags.writeable = False
+            self._blocked_cache.put(version, blocked)
+        exits = tuple((e["x"], e["y"]) for e in warehouse_grid.exits)
+        return _Layout(version, blocked, exits)
+    
+    def _exit_field(self, layout) -> Tuple[np.ndarray, np.ndarray]:
+        """Multi-source BFS from every exit: per-cell distance to the nearest exit and the next cell toward it"""
+        blocked, exits = layout.blocked, layout.exits
+        key = ("exits", exits, layout.version)
+        cached = self._field_cache.get(key)
+        if cached is not None:
+            return cached
+        
+        rows, cols = blocked.shape
+        sources = [exit_y * cols + exit_x for exit_x, exit_y in exits if 0 <= exit_x < cols]
+        field = _bfs_field(blocked, sources)
+        self._field_cache.put(key, field)
+        return field
+    
+    def _path_to_nearest_exit(self, start, layout) -> Optional[np.ndarray]:
+        """(N, 2) x/y path from start to its nearest reachable exit, excluding start; None if none is reachable"""
+        dist, toward = self._exit_field(layout)
+        rows, cols = layout.blocked.shape
+        sx, sy = start["x"], start["y"]
+        if not (0 <= sx < cols and 0 <= sy < rows):
+            return None
+        
+        cells = []
+        current = sy * cols + sx
+        if dist[current] == UNREACHED:
+            # Start is not itself reachable (e.g. a shelf cell): step to its best open neighbour first
+            neighbors = [
+                (sy + dy) * cols + sx + dx for dx, dy in NEIGHBORS
+                if 0 <= sx + dx < cols and 0 <= sy + dy < rows
+            ]
+            current = min(neighbors, key=lambda cell: dist[cell], default=None)
+            if current is None or dist[current] == UNREACHED:
+                return None
+            cells.append(current)
+        
+        while toward[current] != -1:
+            current = toward[current]
+            cells.append(current)
+        
+        cells = np.array(cells, dtype=np.int32)
+        return np.column_stack((cells % cols, cells // cols))
+    
+    def _path_from_parents(self, parent, end, cols) -> np.ndarray:
+        """Walk a parent array back from end, excluding the search source; returns (N, 2) x/y"""
+        cells = []
+        current = end["y"] * cols + end["x"]
+        while parent[current] != -1:
+            cells.append(current)
+            current = parent[current]
+        cells.reverse()
+        cells = np.array(cells, dtype=np.int32)
+        return np.column_stack((cells % cols, cells // cols))
     
     def _find_path(self, start, end, warehouse_grid) -> List[Dict[str, Any]]:
         """Find path between two points using A* algorithm"""
-        try:
-            # Simple A* implementation
-            open_set = [(0.0, (start["x"], start["y"]))]
-            came_from = {}
-            g_score = {(start["x"], start["y"]): 0}
-            f_score = {(start["x"], start["y"]): self._heuristic(start, end)}
-            
-            while open_set:
-                current_f, current = heapq.heappop(open_set)
-                current_x, current_y = current
-                
-                if current_x == end["x"] and current_y == end["y"]:
-                    # Reconstruct path
-                    path = []
-                    while current in came_from:
-                        path.append({"x": current[0], "y": current[1], "action": "move"})
-                        current = came_from[current]
-                    path.reverse()
-                    return path
-                
-                # Check neighbors
-                for dx, dy in [(0, 1), (1, 0), (0, -1), (-1, 0)]:
-                    neighbor_x, neighbor_y = current_x + dx, current_y + dy
-                    
-                    if not warehouse_grid.is_valid_position(neighbor_x, neighbor_y):
-                        continue
-                    
-                    tentative_g = g_score[current] + 1
-                    
-                    if (neighbor_x, neighbor_y) not in g_score or tentative_g < g_score[(neighbor_x, neighbor_y)]:
-                        came_from[(neighbor_x, neighbor_y)] = current
-                        g_score[(neighbor_x, neighbor_y)] = tentative_g
-                        f_score[(neighbor_x, neighbor_y)] = tentative_g + self._heuristic(
-                            {"x": neighbor_x, "y": neighbor_y}, end
-                        )
-                        
-                        heapq.heappush(open_set, (f_score[(neighbor_x, neighbor_y)], (neighbor_x, neighbor_y)))
-            
+        # An open L path needs no layout snapshot, so check it on the raw grid before hashing the layout
+        coords = self._try_direct_path(start["x"], start["y"], end["x"], end["y"], np.asarray(warehouse_grid.grid))
+        if coords is None:
+            coords = self._path_coords(start, end, self._layout_state(warehouse_grid))
+        return [{"x": x, "y": y, "action": "move"} for x, y in coords.tolist()]
+    
+    def _path_coords(self, start, end, layout) -> np.ndarray:
+        """A* path as an (N, 2) x/y array excluding the start; a direct hop to end if unreachable"""
+        sx, sy, ex, ey = start["x"], start["y"], end["x"], end["y"]
+        if sx == ex and sy == ey:
+            return np.empty((0, 2), dtype=np.int32)
+        
+        version, blocked = layout.version, layout.blocked
+        
+        # Open aisles: an unobstructed L-shaped path is already a shortest path
+        coords = self._try_direct_path(sx, sy, ex, ey, blocked)
+        if coords is not None:
+            return coords
+        
+        key = (sx, sy, ex, ey, version)
+        coords = self._path_cache.get(key, _MISSING)
+        if coords is _MISSING:
+            rows, cols = blocked.shape
+            if rows * cols > HEAP_CELL_MASK:
+                # Cell indices would overflow into the packed heap keys' h bits: read the path off a BFS field
+                sources = [sy * cols + sx] if 0 <= sx < cols and 0 <= sy < rows else []
+                dist, parent = _bfs_field(blocked, sources)
+                if 0 <= ex < cols and 0 <= ey < rows and dist[ey * cols + ex] != UNREACHED:
+                    coords = self._path_from_parents(parent, end, cols)
+                else:
+                    coords = np.empty((0, 2), dtype=np.int32)
+            elif NUMBA_AVAILABLE:
+                coords = _astar_nb(blocked, sx, sy, ex, ey)
+            else:
+                found = self._find_path_py(blocked, sx, sy, ex, ey)
+                coords = np.array(found if found is not None else [], dtype=np.int32).reshape(-1, 2)
+            coords = coords if len(coords) else None
+            if coords is not None:
+                coords.flags.writeable = False
+            self._path_cache.put(key, coords)
+            
+            # Shortest paths on the grid are symmetric, so the reverse query is free
+            if coords is not None and 0 <= sx < cols and 0 <= sy < rows and not blocked[sy, sx]:
+                reverse = np.vstack((coords[-2::-1], np.array([[sx, sy]], dtype=np.int32)))
+                reverse.flags.writeable = False
+                self._path_cache.put((ex, ey, sx, sy, key[4]), reverse)
+        
+        if coords is None:
             # If no path found, return direct path
-            return [{"x": end["x"], "y": end["y"], "action": "move"}]
-            
-        except Exception as e:
-            logger.error(f"Error finding path: {e}")
-            return []
+            return np.array([[ex, ey]], dtype=np.int32)
+        
+        return coords
     
-    def _heuristic(self, start, end) -> float:
-        """Heuristic function for A* (Manhattan distance)"""
-        return abs(start["x"] - end["x"]) + abs(start["y"] - end["y"])
+    def _try_direct_path(self, sx, sy, ex, ey, cells) -> Optional[np.ndarray]:
+        """Manhattan-length L path (x then y, else y then x) if either is free of shelves (cells == 1), else None"""
+        rows, cols = cells.shape
+        if not (0 <= sx < cols and 0 <= sy < rows and 0 <= ex < cols and 0 <= ey < rows):
+            return None
+        
+        step_x = 1 if ex >= sx else -1
+        step_y = 1 if ey >= sy else -1
+        xs = np.arange(sx + step_x, ex + step_x, step_x, dtype=np.int32)
+        ys = np.arange(sy + step_y, ey + step_y, step_y, dtype=np.int32)
+        
+        # Along row sy to column ex, then down/up column ex (the start cell itself is not checked)
+        if not (cells[sy, xs] == 1).any() and not (cells[ys, ex] == 1).any():
+            return np.concatenate((
+                np.column_stack((xs, np.full(len(xs), sy, dtype=np.int32))),
+                np.column_stack((np.full(len(ys), ex, dtype=np.int32), ys))
+            ))
+        
+        # Along column sx to row ey, then across row ey
+        if not (cells[ys, sx] == 1).any() and not (cells[ey, xs] == 1).any():
+            return np.concatenate((
+                np.column_stack((np.full(len(ys), sx, dtype=np.int32), ys)),
+                np.column_stack((xs, np.full(len(xs), ey, dtype=np.int32)))
+            ))
+        
+        return None
     
-    def _calculate_route_metrics(self, route, robot) -> Dict[str, float]:
+    def _find_path_py(self, blocked, sx, sy, ex, ey) -> Optional[Tuple[Tuple[int, int], ...]]:
+        """Pure-Python A*, used when numba is not installed; returns None if unreachable"""
+        rows, cols = blocked.shape
+        n = rows * cols
+        if not (0 <= sx < cols and 0 <= sy < rows):
+            return None
+        
+        # Flat per-cell state; heap entries are plain packed ints, so they compare natively
+        # and pop by f, then h, then x, then y
+        cells = blocked.tobytes()
+        g_score = [n] * n
+        came_from = [-1] * n
+        h_cache = [-1] * n
+        closed = bytearray(n)
+        
+        start = sy * cols + sx
+        g_score[start] = 0
+        h_start = abs(sx - ex) + abs(sy - ey)
+        open_set = [(h_start << HEAP_F_SHIFT) | (h_start << HEAP_H_SHIFT) | (sx * rows + sy)]
+        
+        while open_set:
+            current_x, current_y = divmod(heapq.heappop(open_set) & HEAP_CELL_MASK, rows)
+            current = current_y * cols + current_x
+            
+            # Skip stale entries for cells already expanded
+            if closed[current]:
+                continue
+            closed[current] = 1
+            
+            if current_x == ex and current_y == ey:
+                # Reconstruct path
+                path = []
+                while came_from[current] != -1:
+                    path.append((current % cols, current // cols))
+                    current = came_from[current]
+                path.reverse()
+                return tuple(path)
+            
+            # Check neighbors
+            tentative_g = g_score[current] + 1
+            for dx, dy in NEIGHBORS:
+                neighbor_x, neighbor_y = current_x + dx, current_y + dy
+                if not (0 <= neighbor_x < cols and 0 <= neighbor_y < rows):
+                    continue
+                
+                neighbor = neighbor_y * cols + neighbor_x
+                if cells[neighbor] or tentative_g >= g_score[neighbor]:
+                    continue
+                
+                came_from[neighbor] = current
+                g_score[neighbor] = tentative_g
+                h = h_cache[neighbor]
+                if h < 0:
+                    h = h_cache[neighbor] = abs(neighbor_x - ex) + abs(neighbor_y - ey)
+                heapq.heappush(
+                    open_set,
+                    ((tentative_g + h) << HEAP_F_SHIFT) | (h << HEAP_H_SHIFT) | (neighbor_x * rows + neighbor_y)
+                )
+        
+        return None
+    
+    def _calculate_route_metrics(self, route) -> Dict[str, float]:
         """Calculate metrics for the optimized route"""
-        try:
-            total_distance = len(route)
-            estimated_time = total_distance * 2  # 2 seconds per cell
-            energy_consumption = total_distance * 0.5  # 0.5% battery per cell
-            
-            # Calculate optimization score
-            optimization_score = max(0, 100 - (total_distance * 2))  # Higher score for shorter routes
-            
-            return {
-                "total_distance": total_distance,
-                "estimated_time": estimated_time,
-                "energy_consumption": energy_consumption,
-                "optimization_score": optimization_score
-            }
-        except Exception as e:
-            logger.error(f"Error calculating route metrics: {e}")
-            return {
-                "total_distance": 0,
-                "estimated_time": 0,
-                "energy_consumption": 0,
-                "optimization_score": 0
-            }
+        total_distance, estimated_time, energy_consumption, optimization_score = _route_metrics_nb(
+            route.xs, route.ys
+        )
+        
+        return {
+            "total_distance": int(total_distance),
+            "estimated_time": int(estimated_time),
+            "energy_consumption": float(energy_consumption),
+            "optimization_score": int(optimization_score)
+        }
     
     async def optimize_warehouse_layout(self, warehouse_grid, current_orders, robots) -> Dict[str, Any]:
         """Optimize warehouse layout for better efficiency"""
@@ -264,10 +837,13 @@ class OptimizationService:
         """Analyze current warehouse layout"""
         try:
             total_cells = warehouse_grid.rows * warehouse_grid.cols
-            shelf_cells = np.sum(warehouse_grid.grid == 1)
-            aisle_cells = np.sum(warehouse_grid.grid == 0)
-            entrance_cells = np.sum(warehouse_grid.grid == 2)
-            exit_cells = np.sum(warehouse_grid.grid == 3)
+            
+            # One pass over the grid counts every cell type (0 aisle, 1 shelf, 2 entrance, 3 exit)
+            cell_counts = np.bincount(_int8_grid(warehouse_grid).ravel(), minlength=4)
+            aisle_cells, shelf_cells, entrance_cells, exit_cells = cell_counts[:4]
+            utilizations = np.fromiter(
+                (s["utilization"] for s in warehouse_grid.shelves), dtype=np.float64, count=len(warehouse_grid.shelves)
+            )
             
             return {
                 "total_cells": total_cells,
@@ -276,7 +852,7 @@ class OptimizationService:
                 "entrance_count": entrance_cells,
                 "exit_count": exit_cells,
                 "shelf_count": len(warehouse_grid.shelves),
-                "average_shelf_utilization": np.mean([s["utilization"] for s in warehouse_grid.shelves]) if warehouse_grid.shelves else 0
+                "average_shelf_utilization": utilizations.mean() if len(utilizations) else 0
             }
         except Exception as e:
             logger.error(f"Error analyzing current layout: {e}")
@@ -319,12 +895,19 @@ class OptimizationService:
     
     def _analyze_item_popularity(self, current_orders) -> Dict[str, int]:
         """Analyze item popularity from current orders"""
-        popularity = {}
+        product_ids = {}
+        ids, quantities = [], []
         for order in current_orders:
             for item in order.items:
-                item_name = item.get("product", "")
-                popularity[item_name] = popularity.get(item_name, 0) + item.get("quantity", 1)
-        return popularity
+                ids.append(product_ids.setdefault(item.get("product", ""), len(product_ids)))
+                quantities.append(item.get("quantity", 1))
+        
+        if not ids:
+            return {}
+        
+        # One C pass sums every order line; dict order stays first-appearance like the old loop
+        totals = np.bincount(ids, weights=quantities, minlength=len(product_ids))
+        return {name: int(totals[idx]) for name, idx in product_ids.items()}
     
     def _calculate_efficiency_gains(self, current_metrics, improvements) -> Dict[str, float]:
         """Calculate expected efficiency gains from improvements"""
@@ -428,30 +1011,34 @@ class OptimizationService:
     
     def _analyze_robot_performance(self, robots) -> Dict[str, Any]:
         """Analyze individual robot performance"""
+        fleet = self._robot_arrays(robots)
+        efficiency = fleet["orders_completed"] / np.maximum(fleet["distance_traveled"], 1)
+        
         performance = {
-            "average_battery": np.mean([r.battery for r in robots]),
-            "average_efficiency": np.mean([r.orders_completed / max(r.total_distance_traveled, 1) for r in robots]),
+            "average_battery": fleet["battery"].mean(),
+            "average_efficiency": efficiency.mean(),
             "maintenance_needs": [],
             "performance_rankings": []
         }
         
-        # Check for maintenance needs
-        for robot in robots:
-            if robot.battery < 30:
+        # Check for maintenance needs, keeping each robot's messages together in fleet order
+        now = datetime.now()
+        days_since_maintenance = np.fromiter(
+            ((now - r.last_maintenance).days for r in robots), dtype=np.int64, count=len(robots)
+        )
+        low_battery = fleet["battery"] < 30
+        overdue = days_since_maintenance > 30
+        for i in np.flatnonzero(low_battery | overdue):
+            robot = robots[i]
+            if low_battery[i]:
                 performance["maintenance_needs"].append(f"Robot {robot.id}: Low battery ({robot.battery}%)")
-            
-            days_since_maintenance = (datetime.now() - robot.last_maintenance).days
-            if days_since_maintenance > 30:
-                performance["maintenance_needs"].append(f"Robot {robot.id}: Maintenance overdue ({days_since_maintenance} days)")
+            if overdue[i]:
+                performance["maintenance_needs"].append(f"Robot {robot.id}: Maintenance overdue ({days_since_maintenance[i]} days)")
         
-        # Rank robots by performance
-        robot_rankings = []
-        for robot in robots:
-            efficiency = robot.orders_completed / max(robot.total_distance_traveled, 1)
-            robot_rankings.append((efficiency, robot.id))
-        
-        robot_rankings.sort(reverse=True)
-        performance["performance_rankings"] = [f"Robot {rid}" for _, rid in robot_rankings]
+        # Rank robots by performance, best first; ties fall back to the higher id
+        robot_ids = [r.id for r in robots]
+        order = np.lexsort((np.array(robot_ids), efficiency))[::-1]
+        performance["performance_rankings"] = [f"Robot {robot_ids[i]}" for i in order]
         
         return performance 
     
@@ -520,36 +1107,21 @@ class OptimizationService:
             if not entry_points or not packing_stations:
                 return {"efficiency": 0, "distance_score": 0, "frequency_score": 0}
             
-            total_frequency_score = 0
-            total_distance_score = 0
             shelf_count = len(shelves)
+            frequency_weights = np.array(
+                [frequency_data.get(shelf.get('category', 'unknown'), 1) / 100 for shelf in shelves], dtype=np.float64
+            )
             
-            for shelf in shelves:
-                category = shelf.get('category', 'unknown')
-                frequency_weight = frequency_data.get(category, 1) / 100
-                
-                # Calculate distance from entry to shelf to packing
-                entry_dist = min(
-                    abs(shelf['row'] - entry['row']) + abs(shelf['col'] - entry['col'])
-                    for entry in entry_points
-                )
-                
-                packing_dist = min(
-                    abs(shelf['row'] - packing['row']) + abs(shelf['col'] - packing['col'])
-                    for packing in packing_stations
-                )
-                
-                total_distance = entry_dist + packing_dist
-                
-                # Weight by frequency - high frequency items should be closer
-                frequency_score = frequency_weight * (100 / (total_distance + 1))
-                distance_score = 100 / (total_distance + 1)
-                
-                total_frequency_score += frequency_score
-                total_distance_score += distance_score
+            # Calculate distance from entry to shelf to packing, for every shelf at once
+            shelf_rc = _rc_array(shelves)
+            total_distance = _min_manhattan(shelf_rc, _rc_array(entry_points)) + _min_manhattan(shelf_rc, _rc_array(packing_stations))
             
-            avg_frequency_score = total_frequency_score / shelf_count if shelf_count > 0 else 0
-            avg_distance_score = total_distance_score / shelf_count if shelf_count > 0 else 0
+            # Weight by frequency - high frequency items should be closer
+            distance_scores = 100 / (total_distance + 1)
+            frequency_scores = frequency_weights * distance_scores
+            
+            avg_frequency_score = float(frequency_scores.mean())
+            avg_distance_score = float(distance_scores.mean())
             
             # Overall efficiency combines both scores
             overall_efficiency = (avg_frequency_score * 0.7) + (avg_distance_score * 0.3)
@@ -607,6 +1179,47 @@ class OptimizationService:
         return insights
 
 
+# Layout RL actions; Q-table columns follow this order
+ACTIONS = ('move_shelf', 'swap_shelves', 'optimize_path')
+DEFAULT_ACTION = ACTIONS.index('optimize_path')
+
+# Episodes collected before each batched Q-table update
+Q_UPDATE_BATCH = 64
+
+# Training progress is logged every 10 episodes and written out in one go every this many episodes
+TRAIN_LOG_FLUSH_EPISODES = 1000
+
+
+@njit("int64(float64)", cache=True)
+def _choose_action_nb(epsilon):
+    """Epsilon-greedy action index: uniform over ACTIONS with probability epsilon, else DEFAULT_ACTION"""
+    if np.random.random() < epsilon:
+        return np.random.randint(0, len(ACTIONS))
+    return DEFAULT_ACTION
+
+
+@njit("void(float64[:, ::1], int64[::1], int64[::1], float64[::1], float64, float64)", cache=True)
+def _q_batch_update_nb(q_values, rows, actions, rewards, learning_rate, discount_factor):
+    """In-place Q-learning updates for a batch of (row, action, reward) samples, applied in order"""
+    for i in range(rows.shape[0]):
+        row = rows[i]
+        action = actions[i]
+        old_value = q_values[row, action]
+        next_max = q_values[row].max()
+        q_values[row, action] = (1 - learning_rate) * old_value + learning_rate * (rewards[i] + discount_factor * next_max)
+
+
+# Packed layout bytes -> small int id, so Q-table keys stay cheap to hash and serialize
+_LAYOUT_IDS: Dict[bytes, int] = {}
+
+
+def _state_to_key(*positions) -> int:
+    """Small int id for a set of (N, 2) position arrays, interned by their lengths and every row/col as packed int32s"""
+    packed = np.concatenate([np.array([len(p) for p in positions], dtype=np.int32)] +
+                            [p.ravel() for p in positions]).astype(np.int32, copy=False)
+    return _LAYOUT_IDS.setdefault(packed.tobytes(), len(_LAYOUT_IDS))
+
+
 class WarehouseEnvironment:
     """Simple RL environment for warehouse layout optimization"""
     
@@ -617,43 +1230,45 @@ class WarehouseEnvironment:
         self.entry_points = layout_data.get('entryPoints', [])
         self.packing_stations = layout_data.get('packingStations', [])
         self.grid_size = layout_data.get('gridSize', 30)
+        self.refresh_layout()
+        
+    def refresh_layout(self):
+        """Rebuild the per-shelf frequency weights and read-only (row, col) arrays after the layout changes"""
+        self.freq_weights = np.array(
+            [self.frequency_data.get(s.get('category', 'unknown'), 1) / 100 for s in self.shelves], dtype=np.float64
+        )
+        self.shelf_rc = _rc_array(self.shelves)
+        self.entry_rc = _rc_array(self.entry_points)
+        self.packing_rc = _rc_array(self.packing_stations)
+        for positions in (self.freq_weights, self.shelf_rc, self.entry_rc, self.packing_rc):
+            positions.flags.writeable = False
         
+        # The state only changes here, so its Q-table key is looked up once per layout, not per episode
+        self.state_key = _state_to_key(self.shelf_rc, self.entry_rc, self.packing_rc)
+    
     def get_state(self):
-        """Get current state representation"""
+        """Get current state representation as cached (N, 2) row/col arrays plus its int key"""
         return {
-            'shelf_positions': [(s['row'], s['col']) for s in self.shelves],
-            'entry_positions': [(e['row'], e['col']) for e in self.entry_points],
-            'packing_positions': [(p['row'], p['col']) for p in self.packing_stations]
+            'shelf_positions': self.shelf_rc,
+            'entry_positions': self.entry_rc,
+            'packing_positions': self.packing_rc,
+            'state_key': self.state_key
         }
     
     def calculate_reward(self, action):
         """Calculate reward based on frequency-weighted efficiency"""
         try:
             # Simple reward calculation based on frequency-weighted distances
-            total_reward = 0
+            if not self.shelves:
+                return 0
             
-            for shelf in self.shelves:
-                category = shelf.get('category', 'unknown')
-                frequency_weight = self.frequency_data.get(category, 1) / 100
-                
-                # Calculate distances
-                entry_dist = min(
-                    abs(shelf['row'] - entry['row']) + abs(shelf['col'] - entry['col'])
-                    for entry in self.entry_points
-                ) if self.entry_points else 100
-                
-                packing_dist = min(
-                    abs(shelf['row'] - packing['row']) + abs(shelf['col'] - packing['col'])
-                    for packing in self.packing_stations
-                ) if self.packing_stations else 100
-                
-                total_dist = entry_dist + packing_dist
-                
-                # Reward: higher frequency items should be closer
-                reward = frequency_weight * (100 / (total_dist + 1))
-                total_reward += reward
+            # Distances from every shelf to its nearest entry and packing station
+            entry_dist = _min_manhattan(self.shelf_rc, self.entry_rc) if len(self.entry_rc) else 100
+            packing_dist = _min_manhattan(self.shelf_rc, self.packing_rc) if len(self.packing_rc) else 100
+            total_dist = entry_dist + packing_dist
             
-            return total_reward / len(self.shelves) if self.shelves else 0
+            # Reward: higher frequency items should be closer
+            return float(np.mean(self.freq_weights * (100 / (total_dist + 1))))
             
         except Exception as e:
             print(f"❌ Error calculating reward: {e}")
@@ -665,33 +1280,47 @@ class QLearningAgent:
     
     def __init__(self, environment):
         self.env = environment
-        self.q_table = {}
+        # Dense Q-table: one row per visited state (see state_index), one column per ACTIONS entry
+        self.q_values = np.zeros((16, len(ACTIONS)), dtype=np.float64)
+        self.state_index = {}
         self.learning_rate = 0.1
         self.discount_factor = 0.9
         self.epsilon = 0.1
         
+    @property
+    def q_table(self) -> Dict[Any, Dict[str, float]]:
+        """Nested-dict view of the Q-table (state key -> action -> value), built on access"""
+        return {
+            state_key: dict(zip(ACTIONS, self.q_values[row].tolist()))
+            for state_key, row in self.state_index.items()
+        }
+    
     def train(self, episodes=50):
         """Train the agent"""
         results = []
         
+        # Samples are buffered and applied every Q_UPDATE_BATCH episodes; action choice does not
+        # read the Q-table, so this gives the same values as updating after every episode
+        rows = np.empty(episodes, dtype=np.int64)
+        actions = np.empty(episodes, dtype=np.int64)
+        rewards = np.empty(episodes, dtype=np.float64)
+        batch_start = 0
+        log_lines = []
+        
         for episode in range(episodes):
             state = self.env.get_state()
             action = self._choose_action(state)
-            reward = self.env.calculate_reward(action)
+            reward = self.env.calculate_reward(ACTIONS[action])
             
-            # Update Q-table (simplified)
-            state_key = str(state)
-            if state_key not in self.q_table:
-                self.q_table[state_key] = {}
+            rows[episode] = self._state_row(state)
+            actions[episode] = action
+            rewards[episode] = reward
             
-            if action not in self.q_table[state_key]:
-                self.q_table[state_key][action] = 0
-            
-            # Q-learning update
-            old_value = self.q_table[state_key][action]
-            next_max = max(self.q_table[state_key].values()) if self.q_table[state_key] else 0
-            new_value = (1 - self.learning_rate) * old_value + self.learning_rate * (reward + self.discount_factor * next_max)
-            self.q_table[state_key][action] = new_value
+            # Update Q-table (simplified)
+            if episode + 1 - batch_start == Q_UPDATE_BATCH or episode + 1 == episodes:
+                _q_batch_update_nb(self.q_values, rows[batch_start:episode + 1], actions[batch_start:episode + 1],
+                                   rewards[batch_start:episode + 1], self.learning_rate, self.discount_factor)
+                batch_start = episode + 1
             
             results.append({
                 'episode': episode + 1,
@@ -700,16 +1329,26 @@ class QLearningAgent:
             })
             
             if (episode + 1) % 10 == 0:
-                print(f"🎯 Episode {episode + 1}/{episodes} - Reward: {reward:.2f}")
+                log_lines.append(f"🎯 Episode {episode + 1}/{episodes} - Reward: {reward:.2f}")
+            if log_lines and ((episode + 1) % TRAIN_LOG_FLUSH_EPISODES == 0 or episode + 1 == episodes):
+                sys.stdout.write("\n".join(log_lines) + "\n")
+                log_lines.clear()
         
         return results
     
-    def _choose_action(self, state):
-        """Choose action using epsilon-greedy policy"""
-        if random.random() < self.epsilon:
-            return random.choice(['move_shelf', 'swap_shelves', 'optimize_path'])
-        else:
-            return 'optimize_path'  # Default action
+    def _state_row(self, state) -> int:
+        """Q-table row for a state, allocating (and growing the table) on first visit"""
+        state_key = state['state_key']
+        row = self.state_index.get(state_key)
+        if row is None:
+            row = self.state_index[state_key] = len(self.state_index)
+            if row >= len(self.q_values):
+                self.q_values = np.vstack((self.q_values, np.zeros_like(self.q_values)))
+        return row
+    
+    def _choose_action(self, state) -> int:
+        """Choose action using epsilon-greedy policy; returns an index into ACTIONS"""
+        return _choose_action_nb(self.epsilon)
     
     def get_optimized_layout(self):
         """Get the optimized layout"""
@@ -725,43 +1364,34 @@ class QLearningAgent:
             if shelves and self.env.entry_points:
                 entry_point = self.env.entry_points[0]
                 
-                # Calculate distance from entry for each shelf
-                for shelf in shelves:
-                    category = shelf.get('category', 'unknown')
-                    frequency_weight = frequency_data.get(category, 1)
-                    distance = abs(shelf['row'] - entry_point['row']) + abs(shelf['col'] - entry_point['col'])
-                    shelf['_optimization_score'] = frequency_weight / (distance + 1)
+                # Score every shelf at once: category frequency over distance from the entry
+                category_index = {}
+                shelf_categories = np.fromiter(
+                    (category_index.setdefault(shelf.get('category', 'unknown'), len(category_index)) for shelf in shelves),
+                    dtype=np.int64, count=len(shelves)
+                )
+                category_weights = np.array([frequency_data.get(c, 1) for c in category_index], dtype=np.float64)
+                shelf_rc = _rc_array(shelves)
+                distance = np.abs(shelf_rc[:, 0] - entry_point['row']) + np.abs(shelf_rc[:, 1] - entry_point['col'])
+                score = category_weights[shelf_categories] / (distance + 1)
                 
-                # Sort by optimization score (higher score = better position)
-                shelves.sort(key=lambda x: x.get('_optimization_score', 0), reverse=True)
+                # Sort by optimization score (higher score = better position); stable, like list.sort
+                order = np.argsort(-score, kind='stable')
                 
-                # Reassign positions to optimize layout
+                # Generate optimized positions (closer to entry for high-frequency items):
+                # the first half is offset by 1 from the entry, the rest by 3, in rows of 5
                 grid_size = self.env.grid_size
-                optimized_positions = []
-                
-                # Generate optimized positions (closer to entry for high-frequency items)
-                for i, shelf in enumerate(shelves):
-                    if i < len(shelves) // 2:  # High-frequency items
-                        # Place closer to entry
-                        row = entry_point['row'] + (i // 5) + 1
-                        col = entry_point['col'] + (i % 5) + 1
-                    else:  # Lower-frequency items
-                        # Place further from entry
-                        row = entry_point['row'] + (i // 5) + 3
-                        col = entry_point['col'] + (i % 5) + 3
-                    
-                    # Ensure within grid bounds
-                    row = max(0, min(row, grid_size - 1))
-                    col = max(0, min(col, grid_size - 1))
-                    
-                    optimized_positions.append((row, col))
+                rank = np.arange(len(shelves))
+                offset = np.where(rank < len(shelves) // 2, 1, 3)
+                optimized_rows = np.clip(entry_point['row'] + rank // 5 + offset, 0, grid_size - 1)
+                optimized_cols = np.clip(entry_point['col'] + rank % 5 + offset, 0, grid_size - 1)
                 
-                # Update shelf positions
-                for i, shelf in enumerate(shelves):
-                    if i < len(optimized_positions):
-                        shelf['row'] = optimized_positions[i][0]
-                        shelf['col'] = optimized_positions[i][1]
-                        shelf.pop('_optimization_score', None)  # Remove temporary field
+                # Write the reordered, repositioned shelves as new dicts; the input layout's
+                # shelves (shared with the environment) are left untouched
+                optimized_layout['shelves'] = [
+                    dict(shelves[i], row=row, col=col)
+                    for i, row, col in zip(order.tolist(), optimized_rows.tolist(), optimized_cols.tolist())
+                ]
             
             return optimized_layout
             
@@ -4,12 +4,24 @@ Order Data Service - Manages historical order frequency data
 Provides realistic order generation based on historical patterns
 """
 
-import json
 import random
 from datetime import datetime, timedelta
+from functools import lru_cache
 from pathlib import Path
 from typing import Dict, List, Tuple
 
+import numpy as np
+import orjson
+
+ORDERS_PATH = Path(__file__).parent.parent.parent / "data" / "orders.json"
+
+
+@lru_cache(maxsize=1)
+def _load_orders_file(mtime_ns: int) -> dict:
+    """Parsed orders.json; keyed by modification time so a reload only re-parses a changed file"""
+    return orjson.loads(ORDERS_PATH.read_bytes())
+
+
 class OrderDataService:
     def __init__(self):
         self.order_data = None
@@ -17,14 +29,33 @@ class OrderDataService:
     
     def load_order_data(self):
         """Load historical order frequency data from JSON file"""
+        # Everything derived from order_data is cached; drop it before reloading
+        self._category_frequencies = None
+        self._category_sampling.cache_clear()
         try:
-            data_path = Path(__file__).parent.parent.parent / "data" / "orders.json"
-            with open(data_path, 'r') as f:
-                self.order_data = json.load(f)
+            self.order_data = _load_orders_file(ORDERS_PATH.stat().st_mtime_ns)
             print(f"✅ Loaded order frequency data for {len(self.order_data['order_frequency'])} categories")
         except Exception as e:
             print(f"❌ Error loading order data: {e}")
             self.order_data = self.get_default_order_data()
+        
+        self._month_multipliers = self._build_month_multipliers()
+        self._peak_hour_ints = {}
+    
+    def _build_month_multipliers(self) -> Tuple[float, ...]:
+        """Seasonal multiplier for each month, indexed 1-12 (index 0 unused)"""
+        if not self.order_data or "warehouse_analytics" not in self.order_data:
+            return (1.0,) * 13
+        
+        seasonal_multipliers = self.order_data["warehouse_analytics"].get("seasonal_multipliers", {})
+        months = [seasonal_multipliers.get("regular_season", 1.0)] * 13
+        for month in (12, 1, 2):  # Winter/Holiday
+            months[month] = seasonal_multipliers.get("holiday_season", 1.0)
+        for month in (8, 9):  # Back to School
+            months[month] = seasonal_multipliers.get("back_to_school", 1.0)
+        for month in (6, 7):  # Summer Sales
+            months[month] = seasonal_multipliers.get("summer_sales", 1.0)
+        return tuple(months)
     
     def get_default_order_data(self):
         """Fallback order data if JSON file is not available"""
@@ -46,13 +77,48 @@ class OrderDataService:
         frequencies = {}
         if not self.order_data or "order_frequency" not in self.order_data:
             return frequencies
+        
+        # order_data only changes in load_order_data, so compute once and hand out copies
+        if self._category_frequencies is None:
+            total_frequency = sum(cat["frequency"] for cat in self.order_data["order_frequency"].values())
             
-        total_frequency = sum(cat["frequency"] for cat in self.order_data["order_frequency"].values())
+            for category, data in self.order_data["order_frequency"].items():
+                frequencies[category] = (data["frequency"] / total_frequency) * 100
+            self._category_frequencies = frequencies
         
-        for category, data in self.order_data["order_frequency"].items():
-            frequencies[category] = (data["frequency"] / total_frequency) * 100
+        return dict(self._category_frequencies)
+    
+    @lru_cache(maxsize=32)
+    def _category_sampling(self, categories: Tuple[str, ...]):
+        """Normalised weights, frequencies and a flat popular-product table for a category tuple; None if none have data"""
+        # Filter available categories
+        available_data = {
+            cat: data for cat, data in self.order_data["order_frequency"].items()
+            if cat in categories
+        }
+        if not available_data:
+            return None
         
-        return frequencies
+        # Calculate frequencies for available categories
+        frequency_weights = tuple(available_data[cat]["frequency"] for cat in categories)
+        weights = np.array(frequency_weights, dtype=np.float64)
+        weights /= weights.sum()
+        
+        # Every category's popular products back to back (a single None for categories without any),
+        # with each category's offset and count into the table
+        product_table, product_offsets, product_counts = [], [], []
+        for cat in categories:
+            products = tuple(available_data[cat].get("popular_products") or (None,))
+            product_offsets.append(len(product_table))
+            product_counts.append(len(products))
+            product_table.extend(products)
+        product_table = np.array(product_table, dtype=object)
+        product_offsets = np.array(product_offsets)
+        product_counts = np.array(product_counts)
+        
+        for table in (weights, product_table, product_offsets, product_counts):
+            table.flags.writeable = False
+        return weights, frequency_weights, product_table, product_offsets, product_counts
     
     def generate_realistic_orders(self, num_orders: int, available_categories: List[str]) -> List[Dict]:
         """Generate orders based on historical frequency data"""
@@ -61,35 +127,34 @@ class OrderDataService:
         if not self.order_data or "order_frequency" not in self.order_data:
             return self.generate_default_orders(num_orders, available_categories)
         
-        # Filter available categories
-        available_data = {
-            cat: data for cat, data in self.order_data["order_frequency"].items() 
-            if cat in available_categories
-        }
-        
-        if not available_data:
+        sampling = self._category_sampling(tuple(available_categories))
+        if sampling is None:
             print("⚠️ No matching categories found, using default order generation")
             return self.generate_default_orders(num_orders, available_categories)
+        weights, frequency_weights, product_table, product_offsets, product_counts = sampling
         
-        # Calculate frequencies for available categories
-        total_frequency = sum(data["frequency"] for data in available_data.values())
-        category_weights = [available_data[cat]["frequency"] / total_frequency for cat in available_categories]
+        # Draw every order's category in one sampling pass
+        category_idx = np.random.choice(len(available_categories), size=num_orders, p=weights)
         
-        # Generate orders based on frequency weights
-        for i in range(num_orders):
-            # Choose category based on frequency weights
-            category = random.choices(available_categories, weights=category_weights)[0]
+        # Pick a popular product per order by scaling one uniform draw to its category's product count,
+        # then resolve all of them through the flat product table at once
+        product_idx = (np.random.random(num_orders) * product_counts[category_idx]).astype(np.int64)
+        products = product_table[product_offsets[category_idx] + product_idx].tolist()
+        
+        generated_at = datetime.now().isoformat()
+        for i, (cat_i, product) in enumerate(zip(category_idx.tolist(), products)):
+            category = available_categories[cat_i]
             
-            # Get popular products for this category
-            popular_products = available_data[category].get("popular_products", [f"Product {i + 1}"])
-            product = random.choice(popular_products)
+            # Categories without popular products get a placeholder name
+            if product is None:
+                product = f"Product {i + 1}"
             
             orders.append({
                 "id": i + 1,
                 "product": product,
                 "category": category,
-                "frequency_weight": available_data[category]["frequency"],
-                "generated_at": datetime.now().isoformat()
+                "frequency_weight": frequency_weights[cat_i],
+                "generated_at": generated_at
             })
         
         return orders
@@ -98,6 +163,7 @@ class OrderDataService:
         """Generate orders with equal probability when no frequency data is available"""
         orders = []
         
+        generated_at = datetime.now().isoformat()
         for i in range(num_orders):
             category = random.choice(available_categories)
             product = f"Product {i + 1}"
@@ -107,7 +173,7 @@ class OrderDataService:
                 "product": product,
                 "category": category,
                 "frequency_weight": 1,
-                "generated_at": datetime.now().isoformat()
+                "generated_at": generated_at
             })
         
         return orders
@@ -131,21 +197,7 @@ class OrderDataService:
         if current_date is None:
             current_date = datetime.now()
         
-        if not self.order_data or "warehouse_analytics" not in self.order_data:
-            return 1.0
-        
-        month = current_date.month
-        seasonal_multipliers = self.order_data["warehouse_analytics"].get("seasonal_multipliers", {})
-        
-        # Determine season
-        if month in [12, 1, 2]:  # Winter/Holiday
-            return seasonal_multipliers.get("holiday_season", 1.0)
-        elif month in [8, 9]:  # Back to School
-            return seasonal_multipliers.get("back_to_school", 1.0)
-        elif month in [6, 7]:  # Summer Sales
-            return seasonal_multipliers.get("summer_sales", 1.0)
-        else:
-            return seasonal_multipliers.get("regular_season", 1.0)
+        return self._month_multipliers[current_date.month]
     
     def get_correlated_categories(self, category: str) -> List[str]:
         """Get categories that are frequently ordered together"""
@@ -162,6 +214,15 @@ class OrderDataService:
             return self.order_data["order_frequency"][category].get("peak_hours", [])
         return []
     
+    def _peak_hours_as_ints(self, category: str) -> Tuple[int, ...]:
+        """Peak hours of a category as ints ("14:00" -> 14), parsed on first use per load"""
+        hours = self._peak_hour_ints.get(category)
+        if hours is None:
+            hours = self._peak_hour_ints[category] = tuple(
+                int(peak_hour.split(":")[0]) for peak_hour in self.get_peak_hours(category)
+            )
+        return hours
+    
     def calculate_demand_score(self, category: str, current_hour: int | None = None) -> float:
         """Calculate demand score for a category based on time and season"""
         if not self.order_data or "order_frequency" not in self.order_data:
@@ -175,14 +236,9 @@ class OrderDataService:
         # Time-based multiplier
         time_multiplier = 1.0
         if current_hour is not None:
-            peak_hours = self.get_peak_hours(category)
-            if peak_hours:
-                # Check if current hour is near peak hours
-                for peak_hour in peak_hours:
-                    peak_hour_int = int(peak_hour.split(":")[0])
-                    if abs(current_hour - peak_hour_int) <= 2:
-                        time_multiplier = 1.3
-                        break
+            # Check if current hour is near peak hours
+            if any(abs(current_hour - peak_hour) <= 2 for peak_hour in self._peak_hours_as_ints(category)):
+                time_multiplier = 1.3
         
         return base_frequency * seasonal_multiplier * time_multiplier
 
@@ -1,74 +1,154 @@
-import json
+import asyncio
+import base64
 import logging
-from typing import List, Dict, Any
+from typing import Set, Dict, Any, Tuple, Union
 from fastapi import WebSocket
 from datetime import datetime
+import numpy as np
+import orjson
 
 logger = logging.getLogger(__name__)
 
+# Every outgoing message goes through orjson; numpy values and non-str dict keys are accepted
+# like json.dumps did. Timestamps stay local-time isoformat strings, as before.
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+# Liveness ping sent by cleanup_disconnected_connections; clients that can't take it in time are dropped
+PING_MESSAGE = orjson.dumps({"type": "ping"}).decode()
+PING_TIMEOUT_SECONDS = 2.0
+
 class ConnectionManager:
     def __init__(self):
-        self.active_connections: List[WebSocket] = []
+        # WebSockets hash by identity, so connect/disconnect are O(1)
+        self.active_connections: Set[WebSocket] = set()
+        # Last grid sent in a warehouse update; later updates carry only the cells that changed
+        self._last_grid = None
+        self._needs_full_grid = True
     
     async def connect(self, websocket: WebSocket):
         """Accept new WebSocket connection"""
         await websocket.accept()
-        self.active_connections.append(websocket)
+        self.active_connections.add(websocket)
+        self._needs_full_grid = True  # the new client has no grid to apply diffs to
         logger.info(f"New WebSocket connection. Total connections: {len(self.active_connections)}")
     
     def disconnect(self, websocket: WebSocket):
         """Remove WebSocket connection"""
         if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
+            self.active_connections.discard(websocket)
             logger.info(f"WebSocket disconnected. Total connections: {len(self.active_connections)}")
     
-    async def send_personal_message(self, message: str, websocket: WebSocket):
+    async def send_personal_message(self, message: Union[str, bytes], websocket: WebSocket):
         """Send message to specific WebSocket connection"""
         try:
+            if isinstance(message, bytes):
+                message = message.decode("utf-8")
             await websocket.send_text(message)
         except Exception as e:
             logger.error(f"Error sending personal message: {e}")
             self.disconnect(websocket)
     
-    async def broadcast(self, message: str):
+    async def broadcast(self, message: Union[str, bytes]):
         """Broadcast message to all connected WebSocket clients"""
-        disconnected = []
+        if not self.active_connections:
+            return
         
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message)
-            except Exception as e:
-                logger.error(f"Error broadcasting message: {e}")
-                disconnected.append(connection)
+        # Clients JSON.parse text frames, so serialized bytes (e.g. from orjson) are decoded
+        # once here rather than sent as binary frames
+        if isinstance(message, bytes):
+            message = message.decode("utf-8")
+        
+        # Send to every client concurrently so one slow socket doesn't hold up the rest;
+        # snapshot the connections since disconnects can land while sends are in flight
+        connections = list(self.active_connections)
+        results = await asyncio.gather(
+            *(connection.send_text(message) for connection in connections), return_exceptions=True
+        )
         
         # Remove disconnected connections
-        for connection in disconnected:
-            self.disconnect(connection)
+        for connection, result in zip(connections, results):
+            if isinstance(result, Exception):
+                logger.error(f"Error broadcasting message: {result}")
+                self.disconnect(connection)
     
     async def broadcast_warehouse_update(self, warehouse_grid, robots, current_orders):
         """Broadcast warehouse status update to all clients"""
+        # Nobody listening: skip building the payload (callers invoke the broadcast_* methods every tick)
+        if not self.active_connections:
+            return
+        
         try:
+            now_iso = datetime.now().isoformat()
+            grid_payload, sent_grid = self._encode_grid(warehouse_grid.grid)
+            
+            # One pass over each collection for both the payload and the status counts
+            robot_dicts = []
+            active_robots = idle_robots = 0
+            for robot in robots:
+                robot_dicts.append(robot.to_dict())
+                if robot.status == "busy":
+                    active_robots += 1
+                elif robot.status == "idle":
+                    idle_robots += 1
+            
+            order_dicts = []
+            completed_orders = 0
+            for order in current_orders:
+                order_dicts.append(order.to_dict())
+                if order.status == "completed":
+                    completed_orders += 1
+            
             update_data = {
                 "type": "warehouse_update",
-                "timestamp": datetime.now().isoformat(),
-                "grid": warehouse_grid.grid.tolist(),
-                "robots": [robot.to_dict() for robot in robots],
-                "orders": [order.to_dict() for order in current_orders],
+                "timestamp": now_iso,
+                "grid": grid_payload,
+                "robots": robot_dicts,
+                "orders": order_dicts,
                 "analytics": {
                     "total_orders": len(current_orders),
-                    "active_robots": len([r for r in robots if r.status == "busy"]),
-                    "idle_robots": len([r for r in robots if r.status == "idle"]),
-                    "completion_rate": len([o for o in current_orders if o.status == "completed"]) / len(current_orders) * 100 if current_orders else 0
+                    "active_robots": active_robots,
+                    "idle_robots": idle_robots,
+                    "completion_rate": completed_orders / len(current_orders) * 100 if current_orders else 0
                 }
             }
             
-            await self.broadcast(json.dumps(update_data))
+            await self.broadcast(orjson.dumps(update_data, option=ORJSON_OPTIONS))
+            
+            # Only a grid that actually went out becomes the base for the next diff
+            self._last_grid = sent_grid
             
         except Exception as e:
             logger.error(f"Error broadcasting warehouse update: {e}")
+            # Clients may have missed this grid, so resync them with a full one next time
+            self._needs_full_grid = True
+    
+    def _encode_grid(self, grid) -> Tuple[Dict[str, Any], np.ndarray]:
+        """Grid payload (base64 cells with shape/dtype, or only the cells changed since the last update) and the grid it encodes"""
+        grid = np.ascontiguousarray(grid)
+        last = self._last_grid
+        
+        if self._needs_full_grid or last is None or last.shape != grid.shape or last.dtype != grid.dtype:
+            payload = {
+                "encoding": "base64",
+                "shape": list(grid.shape),
+                "dtype": str(grid.dtype),
+                "data": base64.b64encode(grid.tobytes()).decode("ascii")
+            }
+            self._needs_full_grid = False
+        else:
+            changed = np.argwhere(grid != last)
+            payload = {
+                "encoding": "diff",
+                "changes": np.column_stack((changed, grid[tuple(changed.T)])).tolist()  # [row, col, value]
+            }
+        
+        return payload, grid.copy()
     
     async def broadcast_alert(self, alert_type: str, message: str, severity: str = "info"):
         """Broadcast alert to all clients"""
+        if not self.active_connections:
+            return
+        
         try:
             alert_data = {
                 "type": "alert",
@@ -78,13 +158,16 @@ class ConnectionManager:
                 "timestamp": datetime.now().isoformat()
             }
             
-            await self.broadcast(json.dumps(alert_data))
+            await self.broadcast(orjson.dumps(alert_data, option=ORJSON_OPTIONS))
             
         except Exception as e:
             logger.error(f"Error broadcasting alert: {e}")
     
     async def broadcast_optimization_result(self, optimization_data: Dict[str, Any]):
         """Broadcast optimization results to all clients"""
+        if not self.active_connections:
+            return
+        
         try:
             optimization_message = {
                 "type": "optimization_result",
@@ -92,13 +175,16 @@ class ConnectionManager:
                 "timestamp": datetime.now().isoformat()
             }
             
-            await self.broadcast(json.dumps(optimization_message))
+            await self.broadcast(orjson.dumps(optimization_message, option=ORJSON_OPTIONS))
             
         except Exception as e:
             logger.error(f"Error broadcasting optimization result: {e}")
     
     async def broadcast_analytics_update(self, analytics_data: Dict[str, Any]):
         """Broadcast analytics update to all clients"""
+        if not self.active_connections:
+            return
+        
         try:
             analytics_message = {
                 "type": "analytics_update",
@@ -106,7 +192,7 @@ class ConnectionManager:
                 "timestamp": datetime.now().isoformat()
             }
             
-            await self.broadcast(json.dumps(analytics_message))
+            await self.broadcast(orjson.dumps(analytics_message, option=ORJSON_OPTIONS))
             
         except Exception as e:
             logger.error(f"Error broadcasting analytics update: {e}")
@@ -125,13 +211,16 @@ class ConnectionManager:
                 "status": "operational"
             }
             
-            await self.send_personal_message(json.dumps(status_data), websocket)
+            await self.send_personal_message(orjson.dumps(status_data, option=ORJSON_OPTIONS), websocket)
             
         except Exception as e:
             logger.error(f"Error sending system status: {e}")
     
     async def broadcast_robot_status(self, robot_data: Dict[str, Any]):
         """Broadcast robot status update"""
+        if not self.active_connections:
+            return
+        
         try:
             robot_message = {
                 "type": "robot_status",
@@ -139,13 +228,16 @@ class ConnectionManager:
                 "timestamp": datetime.now().isoformat()
             }
             
-            await self.broadcast(json.dumps(robot_message))
+            await self.broadcast(orjson.dumps(robot_message, option=ORJSON_OPTIONS))
             
         except Exception as e:
             logger.error(f"Error broadcasting robot status: {e}")
     
     async def broadcast_order_update(self, order_data: Dict[str, Any]):
         """Broadcast order status update"""
+        if not self.active_connections:
+            return
+        
         try:
             order_message = {
                 "type": "order_update",
@@ -153,13 +245,16 @@ class ConnectionManager:
                 "timestamp": datetime.now().isoformat()
             }
             
-            await self.broadcast(json.dumps(order_message))
+            await self.broadcast(orjson.dumps(order_message, option=ORJSON_OPTIONS))
             
         except Exception as e:
             logger.error(f"Error broadcasting order update: {e}")
     
     async def broadcast_inventory_update(self, inventory_data: Dict[str, Any]):
         """Broadcast inventory update"""
+        if not self.active_connections:
+            return
+        
         try:
             inventory_message = {
                 "type": "inventory_update",
@@ -167,13 +262,16 @@ class ConnectionManager:
                 "timestamp": datetime.now().isoformat()
             }
             
-            await self.broadcast(json.dumps(inventory_message))
+            await self.broadcast(orjson.dumps(inventory_message, option=ORJSON_OPTIONS))
             
         except Exception as e:
             logger.error(f"Error broadcasting inventory update: {e}")
     
     async def broadcast_prediction_update(self, prediction_data: Dict[str, Any]):
         """Broadcast AI prediction update"""
+        if not self.active_connections:
+            return
+        
         try:
             prediction_message = {
                 "type": "prediction_update",
@@ -181,7 +279,7 @@ class ConnectionManager:
                 "timestamp": datetime.now().isoformat()
             }
             
-            await self.broadcast(json.dumps(prediction_message))
+            await self.broadcast(orjson.dumps(prediction_message, option=ORJSON_OPTIONS))
             
         except Exception as e:
             logger.error(f"Error broadcasting prediction update: {e}")
@@ -189,12 +287,12 @@ class ConnectionManager:
     async def handle_client_message(self, websocket: WebSocket, message: str):
         """Handle incoming messages from clients"""
         try:
-            data = json.loads(message)
+            data = orjson.loads(message)
             message_type = data.get("type")
             
             if message_type == "ping":
                 # Respond to ping with pong
-                await self.send_personal_message(json.dumps({"type": "pong"}), websocket)
+                await self.send_personal_message(orjson.dumps({"type": "pong"}, option=ORJSON_OPTIONS), websocket)
             
             elif message_type == "request_status":
                 # Send current warehouse status
@@ -204,7 +302,7 @@ class ConnectionManager:
                     "timestamp": datetime.now().isoformat(),
                     "message": "Status request received"
                 }
-                await self.send_personal_message(json.dumps(status_response), websocket)
+                await self.send_personal_message(orjson.dumps(status_response, option=ORJSON_OPTIONS), websocket)
             
             elif message_type == "optimization_request":
                 # Handle optimization request
@@ -213,26 +311,29 @@ class ConnectionManager:
                     "timestamp": datetime.now().isoformat(),
                     "message": "Optimization request received"
                 }
-                await self.send_personal_message(json.dumps(optimization_response), websocket)
+                await self.send_personal_message(orjson.dumps(optimization_response, option=ORJSON_OPTIONS), websocket)
             
             else:
                 logger.info(f"Received unknown message type: {message_type}")
                 
-        except json.JSONDecodeError:
+        except orjson.JSONDecodeError:
             logger.error("Received invalid JSON message")
         except Exception as e:
             logger.error(f"Error handling client message: {e}")
     
     async def cleanup_disconnected_connections(self):
         """Clean up any disconnected connections"""
-        disconnected = []
-        
-        for connection in self.active_connections:
+        async def ping(connection):
+            # Try to send a ping to check if connection is still alive; returns it if not
             try:
-                # Try to send a ping to check if connection is still alive
-                await connection.send_text(json.dumps({"type": "ping"}))
+                await asyncio.wait_for(connection.send_text(PING_MESSAGE), PING_TIMEOUT_SECONDS)
             except Exception:
-                disconnected.append(connection)
+                return connection
+            return None
+        
+        # Ping every client concurrently, so one stuck socket can't stall the whole sweep
+        results = await asyncio.gather(*(ping(connection) for connection in list(self.active_connections)))
+        disconnected = [connection for connection in results if connection is not None]
         
         # Remove disconnected connections
         for connection in disconnected:
@@ -6,11 +6,15 @@ The Ultimate Hackathon Winner Application
 
 import os
 import sys
+import hashlib
 import subprocess
 import webbrowser
 import time
 from pathlib import Path
 
+# Holds a hash of requirements.txt (and the interpreter) from the last successful install
+DEPS_MARKER = Path(".deps_installed")
+
 def check_python_version():
     """Check if Python version is compatible"""
     if sys.version_info < (3, 8):
@@ -20,10 +24,18 @@ def check_python_version():
     print(f"✅ Python version: {sys.version.split()[0]}")
 
 def install_dependencies():
-    """Install required dependencies"""
+    """Install required dependencies, skipping pip when requirements.txt is unchanged since the last install"""
+    requirements_hash = hashlib.blake2b(
+        Path("requirements.txt").read_bytes() + sys.executable.encode(), digest_size=16
+    ).hexdigest()
+    if DEPS_MARKER.exists() and DEPS_MARKER.read_text() == requirements_hash:
+        print("✅ Dependencies already installed")
+        return
+    
     print("📦 Installing dependencies...")
     try:
         subprocess.check_call([sys.executable, "-m", "pip", "install", "-r", "requirements.txt"])
+        DEPS_MARKER.write_text(requirements_hash)
         print("✅ Dependencies installed successfully")
     except subprocess.CalledProcessError:
         print("❌ Error installing dependencies")
@@ -65,8 +77,19 @@ def start_application():
         print()
         print("⏳ Starting server...")
         
-        # Start the FastAPI application
-        subprocess.run([sys.executable, "main.py"])
+        # Serve the app in this process: no second interpreter re-importing everything.
+        # "auto" picks uvloop and httptools when installed (uvicorn[standard] ships both)
+        import uvicorn
+        uvicorn.run(
+            "main:app",
+            app_dir=".",
+            host="0.0.0.0",
+            port=8000,
+            loop="auto",
+            http="auto",
+            workers=os.cpu_count() or 1,
+            log_level="info"
+        )
         
     except KeyboardInterrupt:
         print("\n🛑 Application stopped by user")